@@ -15,9 +15,11 @@
 
 import re
 import torch
-from typing import Tuple
+import numpy as np
+from typing import List, Tuple, Union
 from pathlib import Path
 from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers.utils import is_flash_attn_2_available
 
 from sparktts.utils.file import load_config
 from sparktts.models.audio_tokenizer import BiCodecTokenizer
@@ -46,14 +48,33 @@ class SparkTTS:
     def _initialize_inference(self):
         """Initializes the tokenizer, model, and audio tokenizer for inference."""
         self.tokenizer = AutoTokenizer.from_pretrained(f"{self.model_dir}/LLM")
-        self.model = AutoModelForCausalLM.from_pretrained(f"{self.model_dir}/LLM")
+        self.model = AutoModelForCausalLM.from_pretrained(
+            f"{self.model_dir}/LLM",
+            use_safetensors=True,
+            low_cpu_mem_usage=True,
+            **self._llm_load_kwargs(),
+        )
         self.audio_tokenizer = BiCodecTokenizer(self.model_dir, device=self.device)
         self.model.to(self.device)
 
+    def _llm_load_kwargs(self) -> dict:
+        """Half-precision weights and fused attention for the LLM on CUDA."""
+        if self.device.type != "cuda":
+            return {}
+
+        kwargs = {
+            "torch_dtype": torch.bfloat16
+            if torch.cuda.is_bf16_supported()
+            else torch.float16
+        }
+        if is_flash_attn_2_available():
+            kwargs["attn_implementation"] = "flash_attention_2"
+        return kwargs
+
     def process_prompt(
         self,
         text: str,
-        prompt_speech_path: Path,
+        prompt_speech_path: Union[Path, np.ndarray],
         prompt_text: str = None,
     ) -> Tuple[str, torch.Tensor]:
         """
@@ -61,7 +82,8 @@ class SparkTTS:
 
         Args:
             text (str): The text input to be converted to speech.
-            prompt_speech_path (Path): Path to the audio file used as a prompt.
+            prompt_speech_path (Path | np.ndarray): Path to the audio file used as a prompt,
+                or its mono samples at the model sample rate.
             prompt_text (str, optional): Transcript of the prompt audio.
 
         Return:
@@ -154,11 +176,11 @@ class SparkTTS:
 
         return "".join(control_tts_inputs)
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def inference(
         self,
         text: str,
-        prompt_speech_path: Path = None,
+        prompt_speech_path: Union[Path, np.ndarray] = None,
         prompt_text: str = None,
         gender: str = None,
         pitch: str = None,
@@ -166,13 +188,15 @@ class SparkTTS:
         temperature: float = 0.8,
         top_k: float = 50,
         top_p: float = 0.95,
+        max_new_tokens: int = 3000,
     ) -> torch.Tensor:
         """
         Performs inference to generate speech from text, incorporating prompt audio and/or text.
 
         Args:
             text (str): The text input to be converted to speech.
-            prompt_speech_path (Path): Path to the audio file used as a prompt.
+            prompt_speech_path (Path | np.ndarray): Path to the audio file used as a prompt,
+                or its mono samples at the model sample rate.
             prompt_text (str, optional): Transcript of the prompt audio.
             gender (str): female | male.
             pitch (str): very_low | low | moderate | high | very_high
@@ -180,6 +204,7 @@ class SparkTTS:
             temperature (float, optional): Sampling temperature for controlling randomness. Default is 0.8.
             top_k (float, optional): Top-k sampling parameter. Default is 50.
             top_p (float, optional): Top-p (nucleus) sampling parameter. Default is 0.95.
+            max_new_tokens (int, optional): Maximum number of generated tokens. Default is 3000.
 
         Returns:
             torch.Tensor: Generated waveform as a tensor.
@@ -196,7 +221,7 @@ class SparkTTS:
         # Generate speech using the model
         generated_ids = self.model.generate(
             **model_inputs,
-            max_new_tokens=3000,
+            max_new_tokens=max_new_tokens,
             do_sample=True,
             top_k=top_k,
             top_p=top_p,
@@ -233,4 +258,97 @@ class SparkTTS:
             pred_semantic_ids.to(self.device),
         )
 
-        return wav
\ No newline at end of file
+        return wav
+
+    @torch.inference_mode()
+    def generate_batch(
+        self,
+        texts: List[str],
+        gender: str,
+        pitch: str,
+        speed: str,
+        temperature: float = 0.8,
+        top_k: float = 50,
+        top_p: float = 0.95,
+        max_new_tokens: int = 3000,
+        return_exceptions: bool = False,
+    ) -> List[Union[np.ndarray, Exception]]:
+        """
+        Generates speech for several texts with one batched LLM decode.
+
+        All texts share the same voice attributes and sampling parameters. Voice
+        cloning needs per-prompt audio tokenization and goes through `inference`.
+
+        Args:
+            texts (List[str]): The text inputs to be converted to speech.
+            gender (str): female | male.
+            pitch (str): very_low | low | moderate | high | very_high
+            speed (str): very_low | low | moderate | high | very_high
+            temperature (float, optional): Sampling temperature for controlling randomness. Default is 0.8.
+            top_k (float, optional): Top-k sampling parameter. Default is 50.
+            top_p (float, optional): Top-p (nucleus) sampling parameter. Default is 0.95.
+            max_new_tokens (int, optional): Maximum number of generated tokens per text. Default is 3000.
+            return_exceptions (bool, optional): Return the exception in place of the waveform
+                for a text that fails to decode instead of raising it. Default is False.
+
+        Returns:
+            List[np.ndarray]: Generated waveform (or exception) for each text.
+        """
+        prompts = [
+            self.process_prompt_control(gender, pitch, speed, text) for text in texts
+        ]
+
+        # Left padding keeps every prompt flush against its generated tokens
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"
+        try:
+            model_inputs = self.tokenizer(
+                prompts, return_tensors="pt", padding=True
+            ).to(self.device)
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+        generated_ids = self.model.generate(
+            **model_inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            top_k=top_k,
+            top_p=top_p,
+            temperature=temperature,
+            pad_token_id=self.tokenizer.pad_token_id,
+        )
+
+        # All prompts are padded to the same length, so trim them in one slice
+        generated_ids = generated_ids[:, model_inputs.input_ids.shape[1] :]
+        predicts = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+
+        wavs = []
+        for predict in predicts:
+            try:
+                wavs.append(self._detokenize_prediction(predict))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                wavs.append(e)
+
+        return wavs
+
+    def _detokenize_prediction(self, predict: str) -> np.ndarray:
+        """Converts one decoded controllable-TTS output back to a waveform."""
+        pred_semantic_ids = (
+            torch.tensor([int(token) for token in re.findall(r"bicodec_semantic_(\d+)", predict)])
+            .long()
+            .unsqueeze(0)
+        )
+        global_token_ids = (
+            torch.tensor([int(token) for token in re.findall(r"bicodec_global_(\d+)", predict)])
+            .long()
+            .unsqueeze(0)
+        )
+        if pred_semantic_ids.numel() == 0 or global_token_ids.numel() == 0:
+            raise ValueError("Model output contains no speech tokens")
+
+        return self.audio_tokenizer.detokenize(
+            global_token_ids.to(self.device),
+            pred_semantic_ids.to(self.device),
+        )
@@ -5,13 +5,22 @@ Supports all CLI parameters with S3 integration
 """
 
 import os
+import io
+import re
 import sys
 import json
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import torch
+import numpy as np
 import soundfile as sf
+import soxr
 import logging
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import boto3
 from botocore.exceptions import NoCredentialsError
 import runpod
@@ -20,7 +29,19 @@ import runpod
 sys.path.append('/runpod-volume/SparkTTS-serverless')
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from model_files import MODEL_ALLOW_PATTERNS, MODEL_IGNORE_PATTERNS, enable_hf_transfer
+
+# Parallel chunked HuggingFace downloads (Spark-TTS and WhisperX weights)
+enable_hf_transfer()
+
+# Optional: WhisperX timings
+try:
+    import whisperx
+except ImportError:
+    whisperx = None
+
 from cli.SparkTTS import SparkTTS
+from sparktts.utils.token_parser import LEVELS_MAP, GENDER_MAP
 from s3_utils import S3Handler
 
 # Configure logging
@@ -30,8 +51,155 @@ logger = logging.getLogger(__name__)
 # Global variables for model persistence
 spark_tts_model = None
 s3_handler = None
+whisperx_model = None
+whisperx_align_cache = {}
+_whisperx_lock = threading.Lock()
+# The shared FasterWhisperPipeline swaps its tokenizer per transcribe() call
+_whisperx_run_lock = threading.Lock()
+# boto3 clients are thread-safe, so uploads can share the handler's client
+_s3_pool = ThreadPoolExecutor(max_workers=4)
 VOLUME_PATH = "/runpod-volume/SparkTTS-serverless"
 MODEL_PATH = f"{VOLUME_PATH}/models/Spark-TTS-0.5B"
+# Micro-batching of concurrent jobs
+MAX_BATCH_SIZE = int(os.environ.get('TTS_MAX_BATCH_SIZE', 8))
+MAX_BATCH_WAIT_MS = int(os.environ.get('TTS_MAX_BATCH_WAIT_MS', 30))
+_job_pool = ThreadPoolExecutor(max_workers=max(MAX_BATCH_SIZE, 1))
+# Job default for max_length, also used for the compile warmup
+DEFAULT_MAX_LENGTH = 4096
+# Spark-TTS control levels, lowest first
+CONTROL_LEVELS = sorted(LEVELS_MAP, key=LEVELS_MAP.get)
+TASK_TOKENS = ('zero_shot', 'cross_lingual', 'continue')
+# Sentence ends: Latin punctuation before whitespace, CJK punctuation anywhere
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|(?<=[。！？])')
+
+class TTSBatcher:
+    """
+    Collect concurrent jobs for a short window and decode compatible ones together
+    
+    Each sentence of a job is one row. Rows without reference audio always go
+    through SparkTTS.generate_batch, alone or grouped with rows in the same
+    window that share every generation parameter, so the result doesn't depend
+    on timing. Voice cloning jobs need their own prompt audio tokenized and go
+    through SparkTTS.inference one sentence at a time.
+    
+    Every model call, including the compile warmup, runs on one dedicated
+    thread, so decodes never interleave on the GPU and the graphs compiled
+    during warmup are the ones every job hits.
+    """
+    
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: int = 30):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._model_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spark-tts")
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+    
+    @staticmethod
+    def _batch_key(kwargs: Dict[str, Any]) -> Optional[tuple]:
+        """Return the grouping key for a job, or None if it can't be batched"""
+        if kwargs.get('prompt_speech_path') is not None:
+            return None
+        key = tuple(sorted(kwargs.items()))
+        try:
+            # Job inputs are arbitrary JSON; lists or dicts can't be grouped on
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    
+    def run(self, fn, *args, **kwargs):
+        """Run a model call on the model thread and wait for its result"""
+        return self._model_thread.submit(fn, *args, **kwargs).result()
+    
+    def generate(self, texts: List[str], kwargs: Dict[str, Any]) -> List[np.ndarray]:
+        """Generate audio for each sentence of one job, batching with others when possible"""
+        key = self._batch_key(kwargs)
+        if key is None:
+            return self.run(self._generate_single, texts, kwargs)
+        
+        items = [(key, text, kwargs, Future()) for text in texts]
+        for item in items:
+            if self.max_batch_size <= 1:
+                self.run(self._run_group, [item])
+            else:
+                self._queue.put(item)
+        return [future.result() for _, _, _, future in items]
+    
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            try:
+                groups = {}
+                for item in items:
+                    groups.setdefault(item[0], []).append(item)
+                for group in groups.values():
+                    self.run(self._run_group, group)
+            except Exception as e:
+                # Never let the worker die with callers still waiting on it
+                logger.error("Batch worker error: %s", e)
+                for _, _, _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    @staticmethod
+    def _generate_single(texts, kwargs):
+        with torch.inference_mode():
+            return [spark_tts_model.inference(text=text, **kwargs) for text in texts]
+    
+    @staticmethod
+    def _generate_controllable(texts, kwargs):
+        with torch.inference_mode():
+            return spark_tts_model.generate_batch(texts, return_exceptions=True, **kwargs)
+    
+    def _run_group(self, group):
+        texts = [text for _, text, _, _ in group]
+        try:
+            if len(group) > 1:
+                logger.info("Generating speech for a batch of %s sentences", len(group))
+            results = self._generate_controllable(texts, group[0][2])
+        except Exception as e:
+            for _, _, _, future in group:
+                future.set_exception(e)
+            return
+        
+        # A sentence that fails to decode only fails its own future
+        for (_, _, _, future), result in zip(group, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+tts_batcher = TTSBatcher(MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS)
+
+def get_control_level(offset, step):
+    """Map a signed offset onto the nearest of the five Spark-TTS control levels"""
+    # Round half away from zero so the levels are symmetric around the default
+    index = int(np.clip(np.sign(offset) * np.floor(abs(offset) / step + 0.5), -2, 2))
+    return CONTROL_LEVELS[index + 2]
+
+def split_sentences(text):
+    """Split text into sentences, keeping their end punctuation"""
+    sentences = [sentence.strip() for sentence in SENTENCE_END.split(text)]
+    return [sentence for sentence in sentences if sentence]
+
+def join_sentences(wavs, gap, sample_rate):
+    """Concatenate per-sentence audio with gap seconds of silence in between"""
+    silence = np.zeros(int(round(gap * sample_rate)), dtype=wavs[0].dtype)
+    pieces = [wavs[0]]
+    for wav in wavs[1:]:
+        pieces.extend((silence, wav))
+    return np.concatenate(pieces)
 
 def initialize_models():
     """Initialize models eagerly (no lazy loading)"""
@@ -39,6 +207,10 @@ def initialize_models():
     
     logger.info("Initializing Spark-TTS models...")
     
+    # boto3 logs every request at INFO
+    logging.getLogger('botocore').setLevel(logging.WARNING)
+    logging.getLogger('s3transfer').setLevel(logging.WARNING)
+    
     # Initialize S3 handler with optional custom endpoint URL for Backblaze B2
     s3_handler = S3Handler(
         bucket_name=os.environ.get('S3_BUCKET_NAME'),
@@ -47,17 +219,83 @@ def initialize_models():
         region=os.environ.get('AWS_REGION', 'us-east-1'),
         endpoint_url=os.environ.get('AWS_ENDPOINT_URL')  # For Backblaze B2 or other S3-compatible services
     )
+    # Quick access check so misconfiguration shows up in the startup logs, then
+    # warm the transfer client's pool in the background; both are best-effort,
+    # so S3 problems still only fail jobs that use S3
+    if s3_handler.check_bucket_access():
+        _s3_pool.submit(s3_handler.warm_up)
     
     # Check if models exist on volume
     if not os.path.exists(MODEL_PATH):
-        logger.info(f"Models not found at {MODEL_PATH}, downloading...")
+        logger.info("Models not found at %s, downloading...", MODEL_PATH)
         download_models()
     
+    # Allow TF32 for the remaining FP32 matmuls and convolutions. cuDNN autotuning
+    # stays off: input lengths change every job, so it would re-benchmark constantly
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.set_float32_matmul_precision("high")
+    
     # Initialize Spark-TTS
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    if device.type == "cuda":
+        # Create the CUDA context now rather than inside the first job
+        torch.zeros(1, device=device)
+        torch.cuda.synchronize()
     spark_tts_model = SparkTTS(Path(MODEL_PATH), device=device)
+    if torch.cuda.is_available():
+        # Compile and warm up on the thread that will run every decode
+        tts_batcher.run(compile_spark_tts, spark_tts_model)
+    
+    # Keep WhisperX resident so word timings don't reload it per job
+    if torch.cuda.is_available():
+        try:
+            load_whisperx_model()
+        except Exception as e:
+            logger.warning("WhisperX model not preloaded: %s", e)
+    
     logger.info("Models initialized successfully")
 
+def compile_spark_tts(model):
+    """Compile the LLM decoder for the batched decode path and warm it up"""
+    torch._inductor.config.coordinate_descent_tuning = True
+    torch._inductor.config.fx_graph_cache = True
+    torch._dynamo.config.cache_size_limit = 32
+    
+    llm = model.model
+    original_forward = llm.forward
+    
+    # Batch size and sequence length vary per call, so compile with dynamic shapes
+    # instead of a static cache with CUDA graphs, which would be rebuilt (and
+    # re-recorded) every time a group of a new size or length came in
+    llm.forward = torch.compile(original_forward, dynamic=True, fullgraph=False)
+    
+    # Pay the compile cost at startup instead of on the first job
+    try:
+        logger.info("Warming up compiled Spark-TTS model...")
+        warmup_spark_tts(model)
+    except Exception as e:
+        # Fall back to eager decoding rather than failing every request
+        logger.warning("Spark-TTS warmup failed, running uncompiled: %s", e)
+        llm.forward = original_forward
+        torch._dynamo.reset()
+        # Half-precision problems fail startup here instead of in the first job
+        warmup_spark_tts(model)
+
+def warmup_spark_tts(model):
+    """Run the batched decode path once per warmup shape and check the audio"""
+    # Dynamo specialises size-1 dims, so cover batch size 1 and a batched group
+    for texts in (["hello world"], ["hello world", "hello there"]):
+        wavs = model.generate_batch(
+            texts,
+            gender="male",
+            pitch="moderate",
+            speed="moderate",
+            max_new_tokens=DEFAULT_MAX_LENGTH,
+        )
+        if not all(np.isfinite(wav).all() for wav in wavs):
+            raise RuntimeError("Spark-TTS warmup produced non-finite audio")
+
 def download_models():
     """Download models to volume if not present"""
     os.makedirs(MODEL_PATH, exist_ok=True)
@@ -70,11 +308,14 @@ def download_models():
         snapshot_download(
             repo_id="SparkAudio/Spark-TTS-0.5B",
             local_dir=MODEL_PATH,
-            local_dir_use_symlinks=False
+            local_dir_use_symlinks=False,
+            allow_patterns=MODEL_ALLOW_PATTERNS,
+            ignore_patterns=MODEL_IGNORE_PATTERNS,
+            max_workers=16
         )
         logger.info("Models downloaded successfully")
     except Exception as e:
-        logger.error(f"Failed to download models: {e}")
+        logger.error("Failed to download models: %s", e)
         raise
 
 def handler(job):
@@ -87,7 +328,7 @@ def handler(job):
         
         # Extract parameters (matching cli/inference.py)
         text = job_input.get('text')
-        if not text:
+        if not text or not text.strip():
             return {"error": "Text parameter is required"}
         
         # Optional parameters with defaults
@@ -101,73 +342,103 @@ def handler(job):
         task_token = job_input.get('task_token', 'zero_shot')
         temperature = job_input.get('temperature', 0.7)
         top_p = job_input.get('top_p', 0.95)
-        max_length = job_input.get('max_length', 4096)
+        max_length = job_input.get('max_length', DEFAULT_MAX_LENGTH)
         enable_whisperx = job_input.get('enable_whisperx', False)
         enable_subtitles = job_input.get('enable_subtitles', False)
+        whisperx_language = job_input.get('whisperx_language')
+        
+        if task_token not in TASK_TOKENS:
+            return {"error": f"task_token must be one of: {', '.join(TASK_TOKENS)}"}
+        if task_token != 'zero_shot' and not prompt_speech_url:
+            return {"error": f"task_token {task_token} requires prompt_speech_url"}
+        if task_token == 'continue' and not prompt_text:
+            return {"error": "task_token continue requires prompt_text"}
+        if multi_sentence_gap < 0:
+            return {"error": "multi_sentence_gap must not be negative"}
         
-        # Handle reference audio from S3
-        prompt_speech_16k = None
+        # Cross-lingual cloning keeps only the reference voice; continuing a
+        # transcript in the prompt language would carry that language over
+        if task_token == 'cross_lingual':
+            prompt_text = None
+        
+        generate_kwargs = dict(
+            temperature=temperature,
+            top_p=top_p,
+            max_new_tokens=max_length
+        )
         if prompt_speech_url:
-            logger.info(f"Downloading reference audio from: {prompt_speech_url}")
-            local_ref_path = f"/tmp/ref_audio_{job['id']}.wav"
-            s3_handler.download_file(prompt_speech_url, local_ref_path)
+            # Spark-TTS has no pitch/speed control for a cloned voice
+            if pitch_shift != 0.0 or speed_shift != 1.0:
+                return {"error": "pitch_shift and speed_shift are not supported with prompt_speech_url"}
             
-            # Load and process reference audio
-            import torchaudio
-            waveform, sample_rate = torchaudio.load(local_ref_path)
-            if sample_rate != 16000:
-                resampler = torchaudio.transforms.Resample(sample_rate, 16000)
-                waveform = resampler(waveform)
-            prompt_speech_16k = waveform.squeeze().numpy()
+            # Handle reference audio from S3
+            logger.info("Downloading reference audio from: %s", prompt_speech_url)
+            generate_kwargs.update(
+                prompt_speech_path=load_reference_audio(
+                    s3_handler.download_bytes(prompt_speech_url)
+                ),
+                prompt_text=prompt_text
+            )
+        else:
+            if prompt_text:
+                return {"error": "prompt_text requires prompt_speech_url"}
+            if speaker_gender not in GENDER_MAP:
+                return {"error": f"speaker_gender must be one of: {', '.join(GENDER_MAP)}"}
+            if speed_shift <= 0:
+                return {"error": "speed_shift must be positive"}
             
-            # Clean up temp file
-            os.remove(local_ref_path)
+            # Quantize to the nearest control level: 6 semitones or a factor of sqrt(2) per level
+            generate_kwargs.update(
+                gender=speaker_gender,
+                pitch=get_control_level(pitch_shift, 6.0),
+                speed=get_control_level(np.log2(speed_shift), 0.5)
+            )
         
         # Generate speech
-        logger.info(f"Generating speech for text: {text[:50]}...")
-        audio_data = spark_tts_model.generate(
-            text=text,
-            prompt_text=prompt_text,
-            prompt_speech_16k=prompt_speech_16k,
-            speaker_gender=speaker_gender,
-            pitch_shift=pitch_shift,
-            speed_shift=speed_shift,
-            multi_sentence_gap=multi_sentence_gap,
-            task_token=task_token,
-            temperature=temperature,
-            top_p=top_p,
-            max_length=max_length
+        logger.info("Generating speech for text: %s...", text[:50])
+        audio_data = join_sentences(
+            tts_batcher.generate(split_sentences(text), generate_kwargs),
+            multi_sentence_gap,
+            spark_tts_model.sample_rate
         )
         
-        # Save audio to temp file
-        temp_output_path = f"/tmp/{output_name}_{job['id']}.wav"
-        sf.write(temp_output_path, audio_data, spark_tts_model.sample_rate)
+        # Encode and upload audio in the background while WhisperX runs
+        audio_future = _s3_pool.submit(
+            upload_audio,
+            audio_data,
+            spark_tts_model.sample_rate,
+            f"output/{output_name}_{job['id']}.wav"
+        )
         
         # Process with WhisperX if requested
         word_timings = None
         if enable_whisperx:
             logger.info("Generating word-level timings with WhisperX...")
-            word_timings = generate_word_timings(temp_output_path)
+            word_timings = generate_word_timings(
+                audio_data, spark_tts_model.sample_rate, whisperx_language
+            )
         
         # Generate subtitles if requested
-        subtitles_url = None
+        subtitles_path = None
+        subtitles_future = None
         if enable_subtitles and word_timings:
             logger.info("Generating subtitles...")
             subtitles_path = generate_subtitles(word_timings, output_name, job['id'])
-            subtitles_url = s3_handler.upload_file(
-                subtitles_path,
-                f"output/subtitles/{output_name}_{job['id']}.ass"
-            )
-            os.remove(subtitles_path)
+            if subtitles_path:
+                subtitles_future = _s3_pool.submit(
+                    s3_handler.upload_file,
+                    subtitles_path,
+                    f"output/subtitles/{output_name}_{job['id']}.ass"
+                )
         
-        # Upload audio to S3
-        audio_url = s3_handler.upload_file(
-            temp_output_path,
-            f"output/{output_name}_{job['id']}.wav"
-        )
-        
-        # Clean up temp file
-        os.remove(temp_output_path)
+        # Wait for uploads, then clean up temp files
+        try:
+            audio_url = audio_future.result()
+            subtitles_url = subtitles_future.result() if subtitles_future else None
+        finally:
+            wait([f for f in (audio_future, subtitles_future) if f])
+            if subtitles_path:
+                os.remove(subtitles_path)
         
         # Prepare response
         response = {
@@ -187,102 +458,155 @@ def handler(job):
         return response
         
     except Exception as e:
-        logger.error(f"Error in handler: {str(e)}")
+        logger.error("Error in handler: %s", e)
         return {"error": str(e)}
 
-def generate_word_timings(audio_path):
+def load_reference_audio(audio_bytes, target_sr=16000):
+    """Decode reference audio to mono float32 at the target sample rate"""
+    data, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype='float32', always_2d=False)
+    if data.ndim == 2:
+        data = data.mean(axis=1)
+    if sample_rate != target_sr:
+        data = soxr.resample(data, sample_rate, target_sr, quality='HQ')
+    return data
+
+def upload_audio(audio_data, sample_rate, s3_key):
+    """Encode audio as 16-bit WAV in memory and upload it to S3"""
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, sample_rate, format='WAV', subtype='PCM_16')
+    return s3_handler.upload_bytes(buffer.getvalue(), s3_key, 'audio/wav')
+
+def load_whisperx_model():
+    """Load the WhisperX ASR model once and reuse it across jobs"""
+    global whisperx_model
+    
+    with _whisperx_lock:
+        if whisperx_model is None:
+            if whisperx is None:
+                raise ImportError("whisperx is not installed")
+            
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            compute_type = "int8_float16" if device == "cuda" else "int8"
+            # Greedy decoding is enough when we only need word timings
+            asr_options = {"beam_size": 1, "best_of": 1, "temperatures": [0.0]}
+            logger.info("Loading WhisperX model...")
+            whisperx_model = whisperx.load_model(
+                "large-v3", device, compute_type=compute_type, asr_options=asr_options
+            )
+        return whisperx_model
+
+def get_whisperx_batch_size():
+    """Pick a WhisperX batch size from the free GPU memory"""
+    if not torch.cuda.is_available():
+        return 4
+    
+    free_gb = torch.cuda.mem_get_info()[0] / (1024 ** 3)
+    for min_free_gb, batch_size in ((16, 32), (12, 16), (8, 8), (4, 4)):
+        if free_gb > min_free_gb:
+            return batch_size
+    return 2
+
+def load_align_model(language_code):
+    """Load the WhisperX alignment model for a language, cached per language"""
+    with _whisperx_lock:
+        if language_code not in whisperx_align_cache:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info("Loading WhisperX alignment model for: %s", language_code)
+            whisperx_align_cache[language_code] = whisperx.load_align_model(
+                language_code=language_code, device=device
+            )
+        return whisperx_align_cache[language_code]
+
+def generate_word_timings(audio_data, sample_rate, language=None):
     """Generate word-level timings using WhisperX"""
     try:
-        import whisperx
-        
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        batch_size = 16
-        compute_type = "float16" if device == "cuda" else "int8"
+        batch_size = get_whisperx_batch_size()
         
-        # Load model
-        model = whisperx.load_model("large-v2", device, compute_type=compute_type)
+        # Reuse the resident model
+        model = load_whisperx_model()
         
-        # Transcribe
-        audio = whisperx.load_audio(audio_path)
-        result = model.transcribe(audio, batch_size=batch_size)
+        # WhisperX takes 16 kHz float32 audio directly, no file needed
+        audio = np.asarray(audio_data, dtype=np.float32)
+        if sample_rate != whisperx.audio.SAMPLE_RATE:
+            audio = soxr.resample(audio, sample_rate, whisperx.audio.SAMPLE_RATE, quality='HQ')
         
-        # Align
-        model_a, metadata = whisperx.load_align_model(
-            language_code=result["language"], device=device
-        )
-        result = whisperx.align(
-            result["segments"], model_a, metadata, audio, device,
-            return_char_alignments=False
-        )
+        with _whisperx_run_lock, torch.inference_mode():
+            # Transcribe (a known language skips language detection)
+            result = model.transcribe(audio, batch_size=batch_size, language=language)
+            
+            # Align
+            model_a, metadata = load_align_model(language or result["language"])
+            result = whisperx.align(
+                result["segments"], model_a, metadata, audio, device,
+                return_char_alignments=False
+            )
         
         return result["segments"]
         
     except Exception as e:
-        logger.error(f"WhisperX processing failed: {e}")
+        logger.error("WhisperX processing failed: %s", e)
         return None
 
+# Colours are &HAABBGGRR: white primary, red secondary, black outline, half-transparent black back
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,2,1,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+def format_ass_times(seconds):
+    """Format an array of times in seconds as ASS H:MM:SS.cc timestamps"""
+    centiseconds = np.round(np.asarray(seconds, dtype=np.float64) * 100).astype(np.int64)
+    hours, rem = np.divmod(centiseconds, 360000)
+    minutes, rem = np.divmod(rem, 6000)
+    secs, cs = np.divmod(rem, 100)
+    return [
+        f"{h}:{m:02d}:{s:02d}.{c:02d}"
+        for h, m, s, c in zip(hours.tolist(), minutes.tolist(), secs.tolist(), cs.tolist())
+    ]
+
 def generate_subtitles(word_timings, output_name, job_id):
     """Generate ASS subtitles from word timings"""
     try:
-        import ass
+        starts = format_ass_times([segment['start'] for segment in word_timings])
+        ends = format_ass_times([segment['end'] for segment in word_timings])
         
-        # Create ASS document
-        doc = ass.Document()
-        doc.styles.append(ass.Style(
-            name="Default",
-            fontname="Arial",
-            fontsize=20,
-            primary_color=ass.Color(255, 255, 255),
-            secondary_color=ass.Color(255, 0, 0),
-            outline_color=ass.Color(0, 0, 0),
-            back_color=ass.Color(0, 0, 0, 128),
-            bold=False,
-            italic=False,
-            underline=False,
-            strike_out=False,
-            scale_x=100.0,
-            scale_y=100.0,
-            spacing=0.0,
-            angle=0.0,
-            border_style=1,
-            outline=2.0,
-            shadow=1.0,
-            alignment=2,
-            margin_l=10,
-            margin_r=10,
-            margin_v=10,
-            encoding=1
-        ))
-        
-        # Add events from word timings
-        for segment in word_timings:
-            start_time = int(segment['start'] * 1000)
-            end_time = int(segment['end'] * 1000)
-            text = segment['text'].strip()
-            
-            doc.events.append(ass.Dialogue(
-                layer=0,
-                start=start_time,
-                end=end_time,
-                style="Default",
-                text=text
-            ))
+        # ASS marks line breaks inside an event with \N
+        texts = [segment['text'].strip().replace("\n", "\\N") for segment in word_timings]
+        events = "\n".join(
+            f"Dialogue: 0,{start},{end},Default,,0,0,0,,{text}"
+            for start, end, text in zip(starts, ends, texts)
+        )
         
         # Save to file
         output_path = f"/tmp/{output_name}_{job_id}.ass"
         with open(output_path, "w", encoding='utf-8') as f:
-            doc.dump_file(f)
+            f.write(ASS_HEADER)
+            f.write(events)
+            f.write("\n")
         
         return output_path
         
     except Exception as e:
-        logger.error(f"Subtitle generation failed: {e}")
+        logger.error("Subtitle generation failed: %s", e)
         return None
 
 # Initialize models on startup
 initialize_models()
 
+async def async_handler(job):
+    """Run jobs on worker threads so concurrent jobs can be batched"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_job_pool, handler, job)
+
 # Runpod serverless handler
 runpod.serverless.start({
-    "handler": handler
+    "handler": async_handler,
+    "concurrency_modifier": lambda current_concurrency: max(MAX_BATCH_SIZE, 1)
 })
\ No newline at end of file
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Spark-TTS model download settings shared by handler.py and setup_volume.py
+Importing this module has no side effects
+"""
+
+import os
+import importlib
+import importlib.util
+
+# Only fetch what SparkTTS loads; wav2vec2-large-xlsr-53 ships as a .bin checkpoint only
+MODEL_ALLOW_PATTERNS = [
+    "*.safetensors", "*.json", "*.yaml", "*.txt", "tokenizer*",
+    "wav2vec2-large-xlsr-53/pytorch_model.bin"
+]
+# *.bin is left out so the wav2vec2 checkpoint above still downloads
+MODEL_IGNORE_PATTERNS = [
+    "*.pt", "*.msgpack", "*.h5", "*.onnx", "*.ckpt", "*.md", "*.png", "*.jpg"
+]
+
+
+def enable_hf_transfer() -> bool:
+    """
+    Turn on parallel chunked HuggingFace downloads if hf_transfer is installed
+
+    huggingface_hub reads the setting at import time, so call this before
+    anything imports it. huggingface_hub fails every download if the setting
+    is on but hf_transfer is missing, so it is only set when the package can
+    be found.
+
+    Returns:
+        True if hf_transfer is available
+    """
+    # Pick up packages installed into the venv after this process started
+    importlib.invalidate_caches()
+    if importlib.util.find_spec("hf_transfer") is None:
+        return False
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+    return True
@@ -4,15 +4,23 @@ S3 Utilities for Spark-TTS Runpod Serverless
 Handles file uploads/downloads with pre-signed URLs
 """
 
+import io
 import os
+import time
 import logging
+from functools import lru_cache
 import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
+import requests
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, NoCredentialsError, ClientError
 from typing import Optional
 from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+
 
 class S3Handler:
     """Handle S3 operations for voice references and audio output"""
@@ -31,12 +39,35 @@ class S3Handler:
         self.bucket_name = bucket_name
         self.region = region
         
+        # Parallel byte-range transfers for large objects; small ones stay single-stream
+        self._download_config = TransferConfig(
+            multipart_threshold=8 * MB,
+            multipart_chunksize=8 * MB,
+            max_concurrency=8,
+            use_threads=True
+        )
+        self._upload_config = TransferConfig(
+            multipart_threshold=16 * MB,
+            multipart_chunksize=16 * MB,
+            max_concurrency=8,
+            use_threads=True
+        )
+        
+        # Per-instance memo of pre-signed URLs, keyed by expiration window
+        self._presign_cache = lru_cache(maxsize=1024)(self._presign)
+        
         try:
             # Configure S3 client with optional custom endpoint
             client_config = {
                 'aws_access_key_id': access_key,
                 'aws_secret_access_key': secret_key,
-                'region_name': region
+                'region_name': region,
+                # Keep connections warm across jobs and share the pool with transfer threads
+                'config': Config(
+                    max_pool_connections=32,
+                    tcp_keepalive=True,
+                    retries={'mode': 'adaptive', 'max_attempts': 5}
+                )
             }
             
             # Add endpoint URL if provided (for Backblaze B2 or other S3-compatible services)
@@ -44,9 +75,18 @@ class S3Handler:
                 client_config['endpoint_url'] = endpoint_url
                 
             self.s3_client = boto3.client('s3', **client_config)
-            logger.info(f"S3 client initialized for bucket: {bucket_name}")
+            # Access checks fail fast instead of retrying against an unreachable endpoint
+            self._probe_client = boto3.client('s3', **{
+                **client_config,
+                'config': Config(
+                    connect_timeout=3,
+                    read_timeout=5,
+                    retries={'mode': 'standard', 'max_attempts': 1}
+                )
+            })
+            logger.info("S3 client initialized for bucket: %s", bucket_name)
         except Exception as e:
-            logger.error(f"Failed to initialize S3 client: {e}")
+            logger.error("Failed to initialize S3 client: %s", e)
             raise
     
     def upload_file(self, local_path: str, s3_key: str, expiration: int = 3600) -> str:
@@ -63,23 +103,65 @@ class S3Handler:
         """
         try:
             # Upload file
-            self.s3_client.upload_file(local_path, self.bucket_name, s3_key)
-            logger.info(f"File uploaded to s3://{self.bucket_name}/{s3_key}")
+            self.s3_client.upload_file(
+                local_path, self.bucket_name, s3_key, Config=self._upload_config
+            )
+            logger.debug("File uploaded to s3://%s/%s", self.bucket_name, s3_key)
             
             # Generate pre-signed URL
             url = self.generate_presigned_url(s3_key, 'get_object', expiration)
             return url
             
         except FileNotFoundError:
-            logger.error(f"File not found: {local_path}")
+            logger.error("File not found: %s", local_path)
             raise
         except NoCredentialsError:
             logger.error("AWS credentials not available")
             raise
         except Exception as e:
-            logger.error(f"Failed to upload file: {e}")
+            logger.error("Failed to upload file: %s", e)
+            raise
+    
+    def upload_bytes(self, data: bytes, s3_key: str, content_type: str = 'application/octet-stream',
+                     expiration: int = 3600) -> str:
+        """
+        Upload in-memory data to S3 and return pre-signed URL
+        
+        Args:
+            data: Object contents
+            s3_key: S3 object key
+            content_type: MIME type stored with the object
+            expiration: URL expiration time in seconds
+            
+        Returns:
+            Pre-signed URL for the uploaded object
+        """
+        try:
+            self.s3_client.upload_fileobj(
+                io.BytesIO(data), self.bucket_name, s3_key,
+                ExtraArgs={'ContentType': content_type},
+                Config=self._upload_config
+            )
+            logger.debug("Data uploaded to s3://%s/%s", self.bucket_name, s3_key)
+            
+            return self.generate_presigned_url(s3_key, 'get_object', expiration)
+            
+        except NoCredentialsError:
+            logger.error("AWS credentials not available")
+            raise
+        except Exception as e:
+            logger.error("Failed to upload data: %s", e)
             raise
     
+    def _parse_s3_url(self, s3_url: str):
+        """Split an s3:// path or bare key into (bucket, key)"""
+        if s3_url.startswith('s3://'):
+            # Direct S3 path
+            parts = s3_url[5:].split('/', 1)
+            return parts[0], parts[1] if len(parts) > 1 else ''
+        # Assume it's just the key
+        return self.bucket_name, s3_url
+    
     def download_file(self, s3_url: str, local_path: str) -> str:
         """
         Download file from S3 URL or S3 path
@@ -92,38 +174,76 @@ class S3Handler:
             Path to downloaded file
         """
         try:
-            # Parse S3 URL to get bucket and key
-            if s3_url.startswith('s3://'):
-                # Direct S3 path
-                parts = s3_url[5:].split('/', 1)
-                bucket = parts[0]
-                key = parts[1] if len(parts) > 1 else ''
-            elif s3_url.startswith('http'):
-                # Pre-signed URL - download directly
-                import urllib.request
-                urllib.request.urlretrieve(s3_url, local_path)
-                logger.info(f"File downloaded from URL to: {local_path}")
+            if s3_url.startswith('http'):
+                # Pre-signed URL - stream directly to disk
+                with requests.get(s3_url, stream=True, timeout=60) as response:
+                    response.raise_for_status()
+                    with open(local_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=MB):
+                            f.write(chunk)
+                logger.debug("File downloaded from URL to: %s", local_path)
                 return local_path
-            else:
-                # Assume it's just the key
-                bucket = self.bucket_name
-                key = s3_url
             
             # Download from S3
-            self.s3_client.download_file(bucket, key, local_path)
-            logger.info(f"File downloaded from s3://{bucket}/{key} to: {local_path}")
+            bucket, key = self._parse_s3_url(s3_url)
+            self.s3_client.download_file(bucket, key, local_path, Config=self._download_config)
+            logger.debug("File downloaded from s3://%s/%s to: %s", bucket, key, local_path)
             return local_path
             
         except ClientError as e:
             if e.response['Error']['Code'] == '404':
-                logger.error(f"Object not found: {s3_url}")
+                logger.error("Object not found: %s", s3_url)
+            else:
+                logger.error("Failed to download file: %s", e)
+            raise
+        except Exception as e:
+            logger.error("Download error: %s", e)
+            raise
+    
+    def download_bytes(self, s3_url: str) -> bytes:
+        """
+        Download an object from S3 URL or S3 path into memory
+        
+        Args:
+            s3_url: S3 URL, s3:// path, or object key
+            
+        Returns:
+            Raw object contents
+        """
+        try:
+            if s3_url.startswith('http'):
+                # Pre-signed URL - fetch directly
+                response = requests.get(s3_url, timeout=60)
+                response.raise_for_status()
+                logger.debug("Downloaded %s bytes from URL", len(response.content))
+                return response.content
+            
+            bucket, key = self._parse_s3_url(s3_url)
+            buffer = io.BytesIO()
+            self.s3_client.download_fileobj(bucket, key, buffer, Config=self._download_config)
+            data = buffer.getvalue()
+            logger.debug("Downloaded %s bytes from s3://%s/%s", len(data), bucket, key)
+            return data
+            
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                logger.error("Object not found: %s", s3_url)
             else:
-                logger.error(f"Failed to download file: {e}")
+                logger.error("Failed to download object: %s", e)
             raise
         except Exception as e:
-            logger.error(f"Download error: {e}")
+            logger.error("Download error: %s", e)
             raise
     
+    def _presign(self, s3_key: str, operation: str, expiration: int,
+                 time_bucket: int) -> str:
+        """Pre-signed URL for a key; time_bucket only varies the cache key"""
+        return self.s3_client.generate_presigned_url(
+            ClientMethod=operation,
+            Params={'Bucket': self.bucket_name, 'Key': s3_key},
+            ExpiresIn=expiration
+        )
+    
     def generate_presigned_url(self, s3_key: str, operation: str = 'get_object', 
                                expiration: int = 3600) -> Optional[str]:
         """
@@ -138,19 +258,17 @@ class S3Handler:
             Pre-signed URL or None if error
         """
         try:
-            params = {'Bucket': self.bucket_name, 'Key': s3_key}
-            
-            url = self.s3_client.generate_presigned_url(
-                ClientMethod=operation,
-                Params=params,
-                ExpiresIn=expiration
+            # Reuse a URL for up to a tenth of its lifetime so it never comes back nearly expired
+            window = max(expiration // 10, 1)
+            url = self._presign_cache(
+                s3_key, operation, expiration, int(time.time()) // window
             )
             
-            logger.info(f"Generated pre-signed URL for {s3_key} (expires in {expiration}s)")
+            logger.debug("Generated pre-signed URL for %s (expires in %ss)", s3_key, expiration)
             return url
             
         except ClientError as e:
-            logger.error(f"Failed to generate pre-signed URL: {e}")
+            logger.error("Failed to generate pre-signed URL: %s", e)
             return None
     
     def list_voice_references(self, prefix: str = 'voices/') -> list:
@@ -179,11 +297,11 @@ class S3Handler:
                         'url': self.generate_presigned_url(obj['Key'])
                     })
             
-            logger.info(f"Found {len(files)} voice reference files")
+            logger.info("Found %s voice reference files", len(files))
             return files
             
         except ClientError as e:
-            logger.error(f"Failed to list voice references: {e}")
+            logger.error("Failed to list voice references: %s", e)
             return []
     
     def check_bucket_access(self) -> bool:
@@ -194,19 +312,30 @@ class S3Handler:
             True if accessible, False otherwise
         """
         try:
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
-            logger.info(f"Bucket {self.bucket_name} is accessible")
+            self._probe_client.head_bucket(Bucket=self.bucket_name)
+            logger.info("Bucket %s is accessible", self.bucket_name)
             return True
         except ClientError as e:
             error_code = e.response['Error']['Code']
             if error_code == '404':
-                logger.error(f"Bucket {self.bucket_name} not found")
+                logger.error("Bucket %s not found", self.bucket_name)
             elif error_code == '403':
-                logger.error(f"Access denied to bucket {self.bucket_name}")
+                logger.error("Access denied to bucket %s", self.bucket_name)
             else:
-                logger.error(f"Bucket access check failed: {e}")
+                logger.error("Bucket access check failed: %s", e)
+            return False
+        except BotoCoreError as e:
+            # Missing credentials/bucket name or an unreachable endpoint
+            logger.error("Bucket access check failed: %s", e)
             return False
     
+    def warm_up(self):
+        """Open a pooled connection on the transfer client so the first job skips DNS and TLS setup"""
+        try:
+            self.s3_client.head_bucket(Bucket=self.bucket_name)
+        except (ClientError, BotoCoreError) as e:
+            logger.debug("S3 connection warm-up failed: %s", e)
+    
     def create_bucket_structure(self):
         """Create standard bucket structure for Spark-TTS"""
         prefixes = ['voices/', 'output/', 'output/subtitles/']
@@ -220,6 +349,6 @@ class S3Handler:
                     Body=b'',
                     ContentType='text/plain'
                 )
-                logger.info(f"Created prefix: {prefix}")
+                logger.info("Created prefix: %s", prefix)
             except Exception as e:
-                logger.error(f"Failed to create prefix {prefix}: {e}")
\ No newline at end of file
+                logger.error("Failed to create prefix %s: %s", prefix, e)
\ No newline at end of file
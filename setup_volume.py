@@ -10,6 +10,8 @@ import subprocess
 import logging
 from pathlib import Path
 
+from model_files import MODEL_ALLOW_PATTERNS, MODEL_IGNORE_PATTERNS, enable_hf_transfer
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -82,8 +84,8 @@ def setup_volume():
         "boto3==1.34.25",
         "runpod==1.6.2",
         "huggingface-hub==0.20.2",
-        "whisperx @ git+https://github.com/m-bain/whisperX.git",
-        "ass==0.5.2"
+        "hf_transfer==0.1.8",
+        "whisperx @ git+https://github.com/m-bain/whisperX.git"
     ]
     
     for dep in dependencies:
@@ -107,6 +109,8 @@ def setup_volume():
 def download_models():
     """Download Spark-TTS models from HuggingFace"""
     try:
+        # hf_transfer is installed into the venv by now; enable it before huggingface_hub loads
+        enable_hf_transfer()
         from huggingface_hub import snapshot_download
         
         logger.info("Downloading models from HuggingFace...")
@@ -114,7 +118,10 @@ def download_models():
             repo_id="SparkAudio/Spark-TTS-0.5B",
             local_dir=MODEL_PATH,
             local_dir_use_symlinks=False,
-            cache_dir=CACHE_PATH
+            cache_dir=CACHE_PATH,
+            allow_patterns=MODEL_ALLOW_PATTERNS,
+            ignore_patterns=MODEL_IGNORE_PATTERNS,
+            max_workers=16
         )
         logger.info("Models downloaded successfully")
         
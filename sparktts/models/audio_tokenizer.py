@@ -18,11 +18,11 @@ import torch
 import numpy as np
 
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Tuple, Union
 from transformers import Wav2Vec2FeatureExtractor, Wav2Vec2Model
 
 from sparktts.utils.file import load_config
-from sparktts.utils.audio import load_audio
+from sparktts.utils.audio import load_audio, audio_volume_normalize
 from sparktts.models.bicodec import BiCodec
 
 
@@ -50,7 +50,7 @@ class BiCodecTokenizer:
             f"{self.model_dir}/wav2vec2-large-xlsr-53"
         )
         self.feature_extractor = Wav2Vec2Model.from_pretrained(
-            f"{self.model_dir}/wav2vec2-large-xlsr-53"
+            f"{self.model_dir}/wav2vec2-large-xlsr-53", low_cpu_mem_usage=True
         ).to(self.device)
         self.feature_extractor.config.output_hidden_states = True
 
@@ -69,13 +69,20 @@ class BiCodecTokenizer:
 
         return wav[:ref_segment_length]
 
-    def process_audio(self, wav_path: Path) -> Tuple[np.ndarray, torch.Tensor]:
-        """load auido and get reference audio from wav path"""
-        wav = load_audio(
-            wav_path,
-            sampling_rate=self.config["sample_rate"],
-            volume_normalize=self.config["volume_normalize"],
-        )
+    def process_audio(
+        self, wav_path: Union[Path, np.ndarray]
+    ) -> Tuple[np.ndarray, torch.Tensor]:
+        """load auido and get reference audio from wav path or mono samples at the model sample rate"""
+        if isinstance(wav_path, np.ndarray):
+            wav = wav_path
+            if self.config["volume_normalize"]:
+                wav = audio_volume_normalize(wav)
+        else:
+            wav = load_audio(
+                wav_path,
+                sampling_rate=self.config["sample_rate"],
+                volume_normalize=self.config["volume_normalize"],
+            )
 
         wav_ref = self.get_ref_clip(wav)
 
@@ -116,7 +123,9 @@ class BiCodecTokenizer:
 
         return global_tokens, semantic_tokens
 
-    def tokenize(self, audio_path: str) -> Tuple[torch.Tensor, torch.Tensor]:
+    def tokenize(
+        self, audio_path: Union[str, Path, np.ndarray]
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
         """tokenize the audio"""
         wav, ref_wav = self.process_audio(audio_path)
         feat = self.extract_wav2vec2_features(wav)